@@ -1,61 +1,73 @@
-my $cbfs=`find . -name 'data_mutations*' |grep -v ccle|grep -vi pdx|grep -vi test`;
+use List::Util qw(max);
+use File::Find;
+#Cell line (ccle), PDX and test studies are excluded by path
+my $modelre=qr/ccle|(?i:pdx|test)/;
+#Files larger than this are read with plain buffered I/O instead of mmap
+my $mmaplimit=4*1024**3;
+#Output is collected and written to STDOUT in blocks of about this size
+my $outblock=1<<20;
+my $out="";
 #my $cbfs=`find . -name 'data_mutations*' |grep test`;
+my @cbf;
+find(sub {
+	#Do not descend into .git, other hidden directories or excluded studies
+	if ($_ ne "." && (/^\./ || /$modelre/) && -d) { $File::Find::prune=1; return; }
+	push(@cbf,$File::Find::name) if (/^data_mutations/);
+}, ".");
 open(CNT,">cnt");
-my @cbf=split(/\n/,$cbfs);
+#Clean: one file per study+center, sorted so the same file wins every run
+@cbf=grep {
+	my ($dor,$fm,$projname)=split(/\//);
+	my ($study,$center)=split("\_",$projname);
+	!$seen{$study.$center}++;
+} grep { !/$modelre/ } sort @cbf;
 foreach my $proj (@cbf) {
 my ($dor,$fm,$projname,$file)=split(/\//,$proj);
-my ($study,$center,$r)=split("\_",$projname);
-my $uid=$study.$center;
-#Clean
-next if ($seen{$uid}++);
 #next if ($proj=~/ccle/i);
-#print "$projname\t$study\t$center\t$proj\n";
-open(F,$proj);
+open(F,(-s $proj > $mmaplimit) ? "<" : "<:mmap",$proj);
 my $h;
 do {
 	$h=<F>;
 } until ($h!~/^#/);
 my @h=split(/\t/,$h);
-my $gene;
-my $vtype;
-my $classification;
-my $hgvsp;
-for my $i (0..$#h) {
-	if ($h[$i] eq "Hugo_Symbol") {
-		$gene=$i;
-	}
-	if ($h[$i] eq "Variant_Type") {
-		$vtype=$i;
-	}
-	if ($h[$i] eq "HGVSp") {
-		$hgvsp=$i;
-	}
-	if ($h[$i] eq "Tumor_Sample_Barcode") {
-                $sample=$i;
-        }
-	if ($h[$i] eq "Consequence") {
-                $classification=$i;
-        }
-
-}
+my %col;
+@col{@h}=(0..$#h);
+my $gene=$col{Hugo_Symbol};
+my $vtype=$col{Variant_Type};
+my $classification=$col{Consequence};
+my $hgvsp=$col{HGVSp};
+$sample=$col{Tumor_Sample_Barcode} if (exists $col{Tumor_Sample_Barcode});
 unless ($hgvsp) { warn $projname; next; }
+#Only split as far as the last column we use
+my $ncol=max(grep { defined } $gene,$vtype,$hgvsp,$sample,$classification)+2;
 my ($fsstart,$fslen);
 while (my $b=<F>) {
-	next if ($b=~/^\#/);
-	my @d=split(/\t/,$b);
+	next if (ord($b)==ord("#"));
+	my @d=split(/\t/,$b,$ncol);
 	my ($fsstart,$fslen);
-	$d[$vtype]="SNP" if ($d[$classification]=~/inframe/i);
-	if ($d[$classification] !~/frameshift/i) {
-		$fslen=0;
-	}
-	else {
-		($fsstart,$fslen)=$d[$hgvsp]=~/(\d+)/g;
+	(my $cls=$d[$classification])=~tr/A-Z/a-z/;
+	#inframe and frameshift both contain "frame"; most rows have neither
+	if (index($cls,"frame")>=0) {
+		$d[$vtype]="SNP" if (index($cls,"inframe")>=0);
+		if (index($cls,"frameshift")>=0) {
+			($fsstart,$fslen)=$d[$hgvsp]=~/(\d+)(?:\D+(\d+))?/;
+		}
 	}
 	unless ($fslen) { $fslen=0; }
-	print "$projname\t".$d[$gene]."\t".$d[$sample]."\t".$d[$vtype]."\t".$d[$hgvsp]."\t".$fsstart."\t".$fslen."\n";
+	$out.=join("\t",$projname,@d[$gene,$sample,$vtype,$hgvsp],$fsstart,$fslen)."\n";
+	flushout() if (length($out)>=$outblock);
 	$cnt{$d[$gene]}++;
 }
 }
+flushout();
 foreach my $genek (keys %cnt) {
 	print CNT $genek."\t".$cnt{$genek}."\n";
 }
+
+sub flushout {
+	while (length($out)) {
+		my $n=syswrite(STDOUT,$out);
+		die "write: $!" unless (defined $n);
+		substr($out,0,$n)="";
+	}
+}